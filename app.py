@@ -1,15 +1,24 @@
 import streamlit as st
 import os
+import re
+import hashlib
+import queue
 import tempfile
+import threading
+import time
 import shutil
 import zipfile
-import plotly.graph_objects as go
-from data_manager import DataManager
-from managers import RateLimiter, HistoryManager
-from tts_engine import generate_speech
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from data_manager import DataManager, SETTINGS_FILE
+from managers import RateLimiter, HistoryManager, HISTORY_CACHE_DIR
+from tts_engine import generate_speech, create_client, warm_up_client
 
 # Constants
-GEMINI_VOICES = [
+# Tuples: these are read-only option lists, and immutability guarantees no
+# handler can mutate them between reruns (tuples also hash, so they are
+# usable as cache keys).
+GEMINI_VOICES = (
     "Puck", "Charon", "Kore", "Fenrir", "Aoede",
     "Zephyr", "Orus", "Autonoe", "Umbriel", "Erinome",
     "Laomedeia", "Achird", "Sadachbia", "Leda", "Callirrhoe",
@@ -17,9 +26,181 @@ GEMINI_VOICES = [
     "Gacrux", "Zubenelgenubi", "Vindemiatrix", "Sadaltager",
     "Sulafat", "Iapetus", "Despina", "Rasalgethi", "Alnilam",
     "Pulcherrima"
-]
+)
+
+# Built once at import: main() re-runs on every widget interaction, so the
+# selectbox options shouldn't be reassembled per rerun.
+VOICE_OPTIONS = (*GEMINI_VOICES, "Custom...")
+
+# Matches "Character | Text | Filename" with surrounding whitespace stripped;
+# one compiled-regex match per line instead of split + per-part strip.
+_LINE_RE = re.compile(r'^\s*([^|]+?)\s*\|\s*([^|]+?)\s*\|\s*([^|]+?)\s*$')
+
+# History entries rendered per page; each one costs an st.audio player that
+# reads and encodes its file, so the view is paginated rather than unbounded.
+_HISTORY_PAGE_SIZE = 20
+
+# Session-level LRU cache of sha256(voice|style|text) -> cached WAV path.
+# Re-running a batch with a few edited lines only pays for the edits. The
+# WAVs live in their own directory (like history_cache): batch temp files
+# are cleared when the next batch starts, so a cache entry pointing there
+# would be dead by the time it could hit.
+_TTS_CACHE_MAX = 512
+_TTS_CACHE_DIR = "tts_cache"
+# Stores run on the pool workers while lookups run on the script thread;
+# OrderedDict reordering/eviction isn't thread-safe on its own.
+_TTS_CACHE_LOCK = threading.Lock()
+
+def _tts_cache_key(text, voice, style):
+    return hashlib.sha256(f"{voice}\0{style}\0{text}".encode()).hexdigest()
+
+def _tts_cache_store(cache, key, path):
+    """Links/copies a generated WAV into the persistent cache directory and
+    records it under the LRU key, evicting (and unlinking) the oldest
+    entries past the cap."""
+    cached_path = os.path.join(_TTS_CACHE_DIR, f"{key}.wav")
+    try:
+        os.makedirs(_TTS_CACHE_DIR, exist_ok=True)
+        if not os.path.exists(cached_path):
+            _link_or_copy(path, cached_path)
+    except OSError:
+        return
+    with _TTS_CACHE_LOCK:
+        cache[key] = cached_path
+        cache.move_to_end(key)
+        while len(cache) > _TTS_CACHE_MAX:
+            _, evicted = cache.popitem(last=False)
+            try:
+                os.unlink(evicted)
+            except OSError:
+                pass
+
+def _tts_cache_get(cache, key):
+    """Returns the cached WAV path for key (refreshing its LRU position), or
+    None when the entry is missing or its file is gone."""
+    with _TTS_CACHE_LOCK:
+        cached_path = cache.get(key)
+        if cached_path and os.path.exists(cached_path):
+            cache.move_to_end(key)
+            return cached_path
+        return None
+
+def _link_or_copy(src, dst):
+    """
+    Hardlinks src to dst when the filesystem allows it, so duplicating a
+    generated WAV touches directory entries instead of bytes; falls back to
+    a real copy (cross-device links, existing targets, Windows).
+    """
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy(src, dst)
+
+def _tmp_root():
+    """
+    Prefers tmpfs (/dev/shm) for batch WAVs when available: the files are
+    written once and immediately re-read for playback/zipping, so keeping
+    them in memory skips the block-device round-trip. Returns None to fall
+    back to the platform default temp directory.
+    """
+    path = "/dev/shm"
+    if os.path.isdir(path) and os.access(path, os.W_OK):
+        return path
+    return None
+
+def _clear_batch_dir(temp_dir):
+    """
+    Empties the (flat) batch temp directory in place so the next batch can
+    reuse it: one scandir + unlink pass instead of shutil.rmtree's recursive
+    walk followed by a fresh mkdtemp.
+    """
+    try:
+        for dirent in os.scandir(temp_dir):
+            try:
+                os.unlink(dirent.path)
+            except OSError:
+                pass
+    except OSError:
+        pass
+
+def _stat_settings_mtime():
+    try:
+        return os.stat(SETTINGS_FILE).st_mtime_ns
+    except OSError:
+        return -1
+
+def _settings_mtime():
+    """Cache key for settings-derived values: bumps whenever the file changes.
+
+    main() stats the file once per run and stashes the value in session
+    state, so the various mtime-keyed call sites cost a dict lookup each
+    instead of their own stat syscall.
+    """
+    cached = st.session_state.get("_settings_mtime")
+    if cached is not None:
+        return cached
+    return _stat_settings_mtime()
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def _audio_bytes(path, mtime_ns, size):
+    """Reads a WAV file once per (path, mtime, size); reruns replay the
+    cached bytes instead of re-reading the file for st.audio."""
+    with open(path, "rb") as f:
+        return f.read()
+
+def _play_audio(path):
+    """Renders an audio player from the cached bytes for `path`."""
+    try:
+        info = os.stat(path)
+    except OSError:
+        st.warning("File missing")
+        return
+    st.audio(_audio_bytes(path, info.st_mtime_ns, info.st_size), format="audio/wav")
+
+@st.cache_data(show_spinner=False)
+def _cached_characters(settings_mtime):
+    """
+    Caches the characters dict so sidebar churn doesn't re-read settings.
+    Keyed on the settings file mtime: any save produces a new key, so no
+    manual invalidation is needed and stale entries can't be served.
+    """
+    return DataManager.get_characters()
+
+@st.fragment
+def _rate_limit_fragment(selected_model):
+    """
+    Sidebar rate-limit inputs and usage donuts. A fragment, so editing a
+    limit reruns just this block: the rest of the app (and its settings
+    reads) is skipped while the charts redraw.
+    """
+    limit_min, limit_day = DataManager.get_limits(selected_model)
+    st.caption(f"Rate Limits for **{selected_model}**")
+    col_lim1, col_lim2 = st.columns(2)
+    # Rate Limit Charts
+    stats = RateLimiter.get_usage_stats(selected_model)
+
+    with col_lim1:
+        new_limit_min = st.number_input("Req / Min", value=limit_min, min_value=1, key=f"lim_min_{selected_model}")
+        fig_min = create_donut_chart(stats["used_min"], new_limit_min, "Used")
+        st.plotly_chart(fig_min, use_container_width=True, config={'displayModeBar': False})
+
+    with col_lim2:
+        new_limit_day = st.number_input("Req / Day", value=limit_day, min_value=1, key=f"lim_day_{selected_model}")
+        fig_day = create_donut_chart(stats["used_day"], new_limit_day, "Used")
+        st.plotly_chart(fig_day, use_container_width=True, config={'displayModeBar': False})
+
+    if new_limit_min != limit_min or new_limit_day != limit_day:
+        DataManager.save_limits(new_limit_min, new_limit_day, selected_model)
+        st.success(f"Limits saved for {selected_model}!")
 
 def main():
+    # Persist any settings mutations deferred from the previous run (setters
+    # only mark the in-memory dict dirty; see DataManager.flush).
+    DataManager.flush()
+
+    # One stat per run, after the flush so the value reflects any write above.
+    st.session_state["_settings_mtime"] = _stat_settings_mtime()
+
     st.set_page_config(page_title="Gemini TTS Studio", layout="wide")
     st.title("🎙️ Gemini TTS Studio")
     st.markdown("Generate voiceovers for your characters using **Gemini TTS**.")
@@ -48,15 +229,19 @@ def main():
              available_models = ["gemini-2.5-pro-tts"]
              active_model = "gemini-2.5-pro-tts"
 
+        # One dict build replaces the membership test + linear index() scan.
+        idx_map = {m: i for i, m in enumerate(available_models)}
         selected_model = st.selectbox(
             "Select Gemini Model",
             options=available_models,
-            index=available_models.index(active_model) if active_model in available_models else 0
+            index=idx_map.get(active_model, 0)
         )
 
+        # No rerun needed: everything below keys off selected_model (the
+        # widget value) or reads the active model through the settings cache,
+        # which already reflects this mutation within the current run.
         if selected_model != active_model:
             DataManager.set_active_model(selected_model)
-            st.rerun()
 
         # Manage Models
         with st.expander("Manage Models"):
@@ -78,25 +263,7 @@ def main():
                         st.rerun()
 
         # Rate Limits (Per Selected Model)
-        limit_min, limit_day = DataManager.get_limits(selected_model)
-        st.caption(f"Rate Limits for **{selected_model}**")
-        col_lim1, col_lim2 = st.columns(2)
-        # Rate Limit Charts
-        stats = RateLimiter.get_usage_stats(selected_model)
-
-        with col_lim1:
-            new_limit_min = st.number_input("Req / Min", value=limit_min, min_value=1, key=f"lim_min_{selected_model}")
-            fig_min = create_donut_chart(stats["used_min"], new_limit_min, "Used")
-            st.plotly_chart(fig_min, use_container_width=True, config={'displayModeBar': False})
-
-        with col_lim2:
-            new_limit_day = st.number_input("Req / Day", value=limit_day, min_value=1, key=f"lim_day_{selected_model}")
-            fig_day = create_donut_chart(stats["used_day"], new_limit_day, "Used")
-            st.plotly_chart(fig_day, use_container_width=True, config={'displayModeBar': False})
-
-        if new_limit_min != limit_min or new_limit_day != limit_day:
-            DataManager.save_limits(new_limit_min, new_limit_day, selected_model)
-            st.success(f"Limits saved for {selected_model}!")
+        _rate_limit_fragment(selected_model)
 
         st.divider()
 
@@ -108,7 +275,7 @@ def main():
             char_name = st.text_input("Character Name")
 
             # Voice Selection with fallback to text input
-            voice_selection = st.selectbox("Voice", options=GEMINI_VOICES + ["Custom..."])
+            voice_selection = st.selectbox("Voice", options=VOICE_OPTIONS)
             if voice_selection == "Custom...":
                 char_voice = st.text_input("Enter Voice Name manually")
             else:
@@ -126,7 +293,7 @@ def main():
 
         # List Existing Characters
         st.subheader("Your Characters")
-        characters = DataManager.get_characters()
+        characters = _cached_characters(_settings_mtime())
         if not characters:
             st.info("No characters added yet.")
         else:
@@ -157,9 +324,14 @@ def main():
     script_input = st.text_area("Script Input", height=300, placeholder="Hero | Hello there! | hero_01")
 
     if st.button("Generate Audio", type="primary"):
-        initialize_batch_generation(script_input)
+        if "batch_job" in st.session_state:
+            st.warning("A batch is already running.")
+        else:
+            initialize_batch_generation(script_input)
 
-    if "batch_results" in st.session_state:
+    if "batch_job" in st.session_state:
+        render_batch_progress()
+    elif "batch_results" in st.session_state:
         render_batch_review()
 
     # --- History Section ---
@@ -168,7 +340,15 @@ def main():
         render_history_view()
 
 
+@st.cache_data(max_entries=64, show_spinner=False)
 def create_donut_chart(current, limit, title):
+    # Deferred import: plotly drags in a heavy dependency tree at startup,
+    # and module imports are cached so this is free after the first call.
+    import plotly.graph_objects as go
+
+    # Fully determined by (current, limit, title), so cache the built figure:
+    # the sidebar re-renders on every widget interaction but usage numbers
+    # rarely change between reruns.
     remaining = max(0, limit - current)
     # If over limit, remaining is 0, but current shows full usage
 
@@ -210,16 +390,33 @@ def render_history_view():
         st.info("No history found.")
         return
 
-    # Pagination or Limit could be useful, but for now show all (maybe limit to last 50 for performance if list gets huge)
-    for entry in history:
+    # Page through the history (newest first) instead of rendering it all.
+    total_pages = (len(history) + _HISTORY_PAGE_SIZE - 1) // _HISTORY_PAGE_SIZE
+    page = 1
+    if total_pages > 1:
+        page = st.number_input(
+            f"Page (of {total_pages})",
+            min_value=1, max_value=total_pages, value=1,
+            key="history_page"
+        )
+    start = (page - 1) * _HISTORY_PAGE_SIZE
+
+    # All cached audio lives flat in HISTORY_CACHE_DIR, so one directory
+    # listing replaces a stat syscall per rendered entry.
+    try:
+        existing_files = {e.name for e in os.scandir(HISTORY_CACHE_DIR)}
+    except OSError:
+        existing_files = set()
+
+    for entry in history[start:start + _HISTORY_PAGE_SIZE]:
         with st.container():
             col1, col2 = st.columns([3, 1])
             with col1:
                 st.caption(f"{entry['timestamp']} | {entry['char_name']} ({entry['voice']})")
                 st.text(entry['text'])
             with col2:
-                if os.path.exists(entry['audio_path']):
-                    st.audio(entry['audio_path'])
+                if os.path.basename(entry['audio_path']) in existing_files:
+                    _play_audio(entry['audio_path'])
                 else:
                     st.warning("File missing")
             st.markdown("---")
@@ -230,8 +427,10 @@ def initialize_batch_generation(script_text: str):
         st.error("Please enter your Gemini API Key in the settings.")
         return
 
-    characters = DataManager.get_characters()
-    lines = script_text.strip().split('\n')
+    characters = _cached_characters(_settings_mtime())
+    # splitlines avoids the copy from strip() and handles \r\n input from
+    # pasted Windows scripts; blank lines are skipped in the loop anyway.
+    lines = script_text.splitlines()
 
     if not lines:
         st.warning("Script is empty.")
@@ -245,14 +444,16 @@ def initialize_batch_generation(script_text: str):
         if not line.strip():
             continue
 
-        parts = [p.strip() for p in line.split('|')]
-        if len(parts) != 3:
+        m = _LINE_RE.match(line)
+        if not m:
             errors.append(f"Line {i+1}: Invalid format. Expected 3 parts separated by '|'.")
             continue
 
-        char_name, text, filename = parts
+        char_name, text, filename = m.groups()
 
-        if char_name not in characters:
+        # Single dict lookup instead of a membership test plus a re-fetch.
+        config = characters.get(char_name)
+        if config is None:
             errors.append(f"Line {i+1}: Character '{char_name}' not found in settings.")
             continue
 
@@ -260,7 +461,7 @@ def initialize_batch_generation(script_text: str):
             "char_name": char_name,
             "text": text,
             "filename": filename,
-            "config": characters[char_name],
+            "config": config,
             "versions": [],
             "selected_index": 0
         })
@@ -270,64 +471,147 @@ def initialize_batch_generation(script_text: str):
             st.error(err)
         return
 
-    # Generation Process
-    progress_bar = st.progress(0)
-    status_text = st.empty()
-
-    # Create persistent temp directory
-    # If a temp dir already exists from a previous session, we might want to use it or create a new one.
-    if "batch_temp_dir" in st.session_state and os.path.exists(st.session_state["batch_temp_dir"]):
-         shutil.rmtree(st.session_state["batch_temp_dir"], ignore_errors=True)
-
-    temp_dir = tempfile.mkdtemp()
-    st.session_state["batch_temp_dir"] = temp_dir
-
-    successful_tasks = []
+    # Reuse the temp directory across batches, emptied in place; mkdtemp
+    # only on the first batch of the session.
+    temp_dir = st.session_state.get("batch_temp_dir")
+    if temp_dir and os.path.isdir(temp_dir):
+        _clear_batch_dir(temp_dir)
+    else:
+        temp_dir = tempfile.mkdtemp(dir=_tmp_root())
+        st.session_state["batch_temp_dir"] = temp_dir
 
-    # Get Active Model
+    # Fetch model and limits once for the whole batch; everything below and
+    # the background worker take them as arguments.
     active_model = DataManager.get_active_model()
+    limit_min, limit_day = DataManager.get_limits(active_model)
+
+    # Serve cache hits first so only the remaining lines consume quota or
+    # touch the API at all.
+    tts_cache = st.session_state.setdefault("tts_cache", OrderedDict())
+    pending_tasks = []
+    for task in parsed_tasks:
+        key = _tts_cache_key(task["text"], task["config"]["voice"], task["config"]["style"])
+        task["cache_key"] = key
+        cached_path = _tts_cache_get(tts_cache, key)
+        if cached_path:
+            output_file = os.path.join(temp_dir, f"{task['filename']}_v1.wav")
+            _link_or_copy(cached_path, output_file)
+            task["versions"].append(output_file)
+        else:
+            pending_tasks.append(task)
+
+    # Collapse duplicate lines: synthesize each unique (text, voice, style)
+    # once and fan the result out to every task that asked for it. The
+    # cache key is exactly that tuple, so group on it.
+    groups = OrderedDict()
+    for task in pending_tasks:
+        groups.setdefault(task["cache_key"], []).append(task)
+    pending_tasks = []
+    for members in groups.values():
+        leader = members[0]
+        leader["duplicates"] = members[1:]
+        pending_tasks.append(leader)
+
+    if pending_tasks:
+        # Reserve the pending lines' quota up front: one limiter read/write
+        # per batch instead of a check + log round-trip per line.
+        reserved, limit_msg = RateLimiter.reserve(len(pending_tasks), active_model, limit_min, limit_day)
+        if reserved == 0 and not any(t["versions"] for t in parsed_tasks):
+            st.error(limit_msg)
+            return
+        if limit_msg:
+            _notify("warning", f"{limit_msg} Generated the first {reserved} uncached line(s).")
+            pending_tasks = pending_tasks[:reserved]
+
+    if not pending_tasks:
+        # Everything was served from cache.
+        _finish_batch(parsed_tasks)
+        return
 
-    for idx, task in enumerate(parsed_tasks):
-        char_name = task["char_name"]
-        status_text.text(f"Generating audio for: {task['filename']} ({char_name})...")
-
-        # Initial version file
-        output_filename = f"{task['filename']}_v1.wav"
-        output_file = os.path.join(temp_dir, output_filename)
-        voice = task["config"]["voice"]
-        style = task["config"]["style"]
-
-        # Check Rate Limit
-        allowed, msg = RateLimiter.check_limit(active_model)
-        if not allowed:
-            st.error(f"Stopped at {task['filename']}: {msg}")
-            break
-
+    # Reuse one client for the whole batch (and across batches) so every line
+    # rides the same keep-alive connection instead of a fresh TLS handshake.
+    client = _get_tts_client(api_key, active_model)
+
+    # Hand the batch to a background thread so the script thread stays free:
+    # the page polls the job's queue and the UI remains responsive while
+    # synthesis runs.
+    job = {
+        "tasks": parsed_tasks,
+        "queue": queue.Queue(),
+        "total": len(pending_tasks),
+        "completed": 0,
+        "errors": [],
+    }
+    worker = threading.Thread(
+        target=_run_batch_worker,
+        args=(pending_tasks, api_key, temp_dir, active_model, limit_min, client,
+              st.session_state.get("tts_cache"), job["queue"]),
+        daemon=True,
+    )
+    job["thread"] = worker
+    st.session_state["batch_job"] = job
+    worker.start()
+    st.rerun()
+
+def _run_batch_worker(pending_tasks, api_key, temp_dir, active_model, limit_min, client, tts_cache, event_queue):
+    """
+    Background batch driver. Fans the per-line TTS calls out over a thread
+    pool bounded by the per-minute rate limit (capped at 8 workers) and
+    reports completions through the event queue. Runs outside the script
+    thread, so it must not touch Streamlit.
+    """
+    max_workers = max(1, min(limit_min, 8, len(pending_tasks)))
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(_generate_task_audio, task, api_key, temp_dir,
+                                active_model, client, tts_cache): task
+                for task in pending_tasks
+            }
+            for future in as_completed(futures):
+                task, error = future.result()
+                message = f"Failed to generate {task['filename']}: {error}" if error else None
+                event_queue.put(("task_done", message))
+    finally:
+        event_queue.put(("finished", None))
+
+def render_batch_progress():
+    """Polls the running batch job: drains its queue, shows progress, and
+    reruns every 500 ms until the worker thread finishes."""
+    job = st.session_state["batch_job"]
+
+    finished = False
+    while True:
         try:
-            # Get Active Model for generation
-            active_model = DataManager.get_active_model()
-
-            # Call TTS Engine
-            success = generate_speech(
-                api_key=api_key,
-                text=task["text"],
-                voice_name=voice,
-                style_instructions=style,
-                output_path=output_file,
-                model_name=active_model
-            )
-
-            if success:
-                RateLimiter.log_request(active_model)
-                HistoryManager.add_entry(char_name, task["text"], voice, style, output_file)
-                task["versions"].append(output_file)
-                successful_tasks.append(task)
-            else:
-                st.error(f"Failed to generate audio for {task['filename']}")
-        except Exception as e:
-            st.error(f"Error generating {task['filename']}: {str(e)}")
+            kind, payload = job["queue"].get_nowait()
+        except queue.Empty:
+            break
+        if kind == "task_done":
+            job["completed"] += 1
+            if payload:
+                job["errors"].append(payload)
+        elif kind == "finished":
+            finished = True
+
+    total = job["total"]
+    st.progress(min(job["completed"] / total, 1.0) if total else 1.0,
+                text=f"Generated {job['completed']} of {total} audio file(s)...")
+    for err in job["errors"]:
+        st.error(err)
+
+    if finished or not job["thread"].is_alive():
+        for err in job["errors"]:
+            _notify("error", err)
+        tasks = job["tasks"]
+        del st.session_state["batch_job"]
+        _finish_batch(tasks)
+    else:
+        time.sleep(0.5)
+        st.rerun()
 
-        progress_bar.progress((idx + 1) / len(parsed_tasks))
+def _finish_batch(parsed_tasks):
+    # Preserve the original script order in the results
+    successful_tasks = [t for t in parsed_tasks if t["versions"]]
 
     if successful_tasks:
         st.session_state["batch_results"] = successful_tasks
@@ -335,61 +619,86 @@ def initialize_batch_generation(script_text: str):
     else:
         st.warning("No files were generated.")
 
+def _get_tts_client(api_key, active_model):
+    """
+    Returns a session-cached Gemini client, creating (and warming up) a new
+    one only when the API key changes.
+    """
+    client = st.session_state.get("tts_client")
+    if client is None or st.session_state.get("tts_client_key") != api_key:
+        client = create_client(api_key)
+        warm_up_client(client, active_model)
+        st.session_state["tts_client"] = client
+        st.session_state["tts_client_key"] = api_key
+    return client
+
+def _generate_task_audio(task, api_key, temp_dir, active_model, client=None, tts_cache=None):
+    """
+    Worker for the batch thread pool. Generates the first version of one task.
+    Returns (task, error_message) where error_message is None on success.
+    Must not touch Streamlit widgets: it runs outside the script thread.
+    """
+    output_filename = f"{task['filename']}_v1.wav"
+    output_file = os.path.join(temp_dir, output_filename)
+    voice = task["config"]["voice"]
+    style = task["config"]["style"]
+
+    # Quota for the whole batch was reserved (and logged) up front, so no
+    # per-line rate-limit round-trip is needed here.
+    try:
+        # Call TTS Engine
+        success = generate_speech(
+            api_key=api_key,
+            text=task["text"],
+            voice_name=voice,
+            style_instructions=style,
+            output_path=output_file,
+            model_name=active_model,
+            client=client
+        )
+    except Exception as e:
+        return task, str(e)
+
+    if not success:
+        return task, "No audio data returned."
+
+    # Async: the history copy + append proceeds while this worker moves on
+    # to its next task (or the pool winds down).
+    HistoryManager.add_entry_async(task["char_name"], task["text"], voice, style, output_file)
+    task["versions"].append(output_file)
+    if tts_cache is not None and "cache_key" in task:
+        _tts_cache_store(tts_cache, task["cache_key"], output_file)
+
+    # Fan the result out to duplicate lines that were collapsed at dispatch.
+    for dup in task.get("duplicates", ()):
+        dup_file = os.path.join(temp_dir, f"{dup['filename']}_v1.wav")
+        _link_or_copy(output_file, dup_file)
+        dup["versions"].append(dup_file)
+    return task, None
+
 def render_batch_review():
     st.divider()
     st.subheader("🎧 Review & Download")
 
+    # Show messages queued by callbacks (e.g. regeneration results).
+    for level, message in st.session_state.pop("batch_notices", []):
+        getattr(st, level)(message)
+
     if st.button("Start New Batch", key="start_new_batch_btn"):
-        if "batch_temp_dir" in st.session_state and os.path.exists(st.session_state["batch_temp_dir"]):
-            shutil.rmtree(st.session_state["batch_temp_dir"], ignore_errors=True)
+        temp_dir = st.session_state.get("batch_temp_dir")
+        if temp_dir and os.path.isdir(temp_dir):
+            _clear_batch_dir(temp_dir)
         if "batch_results" in st.session_state:
             del st.session_state["batch_results"]
-        if "batch_temp_dir" in st.session_state:
-            del st.session_state["batch_temp_dir"]
+        if "final_zip_path" in st.session_state:
+            del st.session_state["final_zip_path"]
         st.rerun()
 
     results = st.session_state["batch_results"]
     temp_dir = st.session_state.get("batch_temp_dir")
 
-    for idx, task in enumerate(results):
-        with st.container():
-            st.markdown(f"### {task['filename']} ({task['char_name']})")
-            st.text(f"\"{task['text']}\"")
-
-            # Version Selector
-            num_versions = len(task["versions"])
-            selected_idx = task["selected_index"]
-
-            col1, col2 = st.columns([3, 1])
-
-            with col1:
-                # If multiple versions, let user choose
-                if num_versions > 1:
-                    version_options = [f"Version {i+1}" for i in range(num_versions)]
-                    # Create a unique key for this radio button
-                    selected_v_label = st.radio(
-                        "Select Version",
-                        options=version_options,
-                        index=selected_idx,
-                        key=f"ver_sel_{idx}",
-                        horizontal=True
-                    )
-                    # Update selected index based on selection
-                    new_idx = version_options.index(selected_v_label)
-                    if new_idx != selected_idx:
-                        task["selected_index"] = new_idx
-                        st.rerun()
-
-                current_file = task["versions"][task["selected_index"]]
-                st.audio(current_file)
-
-            with col2:
-                # Regenerate Button
-                if st.button(f"Regenerate", key=f"regen_{idx}"):
-                    regenerate_task_audio(task, temp_dir)
-                    st.rerun()
-
-            st.divider()
+    for idx in range(len(results)):
+        _render_task_review(idx)
 
     # Download ZIP Button
     st.subheader("Download Final Results")
@@ -401,21 +710,100 @@ def render_batch_review():
             st.session_state["final_zip_path"] = zip_path
             st.rerun()
 
-    if "final_zip_path" in st.session_state and os.path.exists(st.session_state["final_zip_path"]):
-        with open(st.session_state["final_zip_path"], "rb") as f:
-            zip_data = f.read()
+    zip_path = st.session_state.get("final_zip_path")
+    if zip_path:
+        try:
+            zip_mtime = os.stat(zip_path).st_mtime_ns
+        except OSError:
+            zip_mtime = None
+        if zip_mtime is not None:
+            st.download_button(
+                label="Download Voiceovers (.zip)",
+                data=_zip_bytes(zip_path, zip_mtime),
+                file_name="voiceovers.zip",
+                mime="application/zip"
+            )
 
-        st.download_button(
-            label="Download Voiceovers (.zip)",
-            data=zip_data,
-            file_name="voiceovers.zip",
-            mime="application/zip"
-        )
+@st.cache_data(show_spinner=False, max_entries=2)
+def _zip_bytes(path, mtime_ns):
+    """
+    Reads the prepared archive once per (path, mtime). Every rerun of the
+    review pane re-renders the download button; without this the file would
+    be re-read and re-served on each interaction.
+    """
+    with open(path, "rb") as f:
+        return f.read()
+
+@st.fragment
+def _render_task_review(idx):
+    """
+    Renders one task's review block. As a fragment, interactions with its
+    widgets (version radio, Regenerate) rerun only this block instead of
+    every task container in the batch.
+    """
+    task = st.session_state["batch_results"][idx]
+
+    with st.container():
+        st.markdown(f"### {task['filename']} ({task['char_name']})")
+        st.text(f"\"{task['text']}\"")
+
+        # Version Selector
+        num_versions = len(task["versions"])
+        selected_idx = task["selected_index"]
+
+        col1, col2 = st.columns([3, 1])
+
+        with col1:
+            # If multiple versions, let user choose
+            if num_versions > 1:
+                version_options = [f"Version {i+1}" for i in range(num_versions)]
+                ver_key = f"ver_sel_{idx}"
+                # Seed the widget state from the task so the radio and the
+                # selected version stay in sync without an explicit rerun.
+                if st.session_state.get(ver_key) not in version_options:
+                    st.session_state[ver_key] = version_options[selected_idx]
+                st.radio(
+                    "Select Version",
+                    options=version_options,
+                    key=ver_key,
+                    horizontal=True,
+                    on_change=_on_version_change,
+                    args=(idx,)
+                )
+
+            current_file = task["versions"][task["selected_index"]]
+            _play_audio(current_file)
+
+        with col2:
+            # Regenerate Button: the callback mutates state before the
+            # natural rerun, so no explicit st.rerun is needed.
+            st.button(f"Regenerate", key=f"regen_{idx}", on_click=_on_regenerate, args=(idx,))
+
+        st.divider()
+
+def _on_version_change(idx):
+    """Radio callback: syncs the task's selected version from widget state."""
+    label = st.session_state[f"ver_sel_{idx}"]
+    st.session_state["batch_results"][idx]["selected_index"] = int(label.rsplit(" ", 1)[-1]) - 1
+
+def _on_regenerate(idx):
+    """Button callback: regenerates one task before the natural rerun."""
+    task = st.session_state["batch_results"][idx]
+    regenerate_task_audio(task, st.session_state.get("batch_temp_dir"))
+    # Point the version radio at the fresh take.
+    st.session_state[f"ver_sel_{idx}"] = f"Version {task['selected_index'] + 1}"
+
+def _notify(level, message):
+    """
+    Queues a message for the next render. Callbacks run before the script
+    re-executes, so st.error/st.success calls inside them would be dropped.
+    """
+    st.session_state.setdefault("batch_notices", []).append((level, message))
 
 def regenerate_task_audio(task, temp_dir):
     api_key = DataManager.get_api_key()
     if not api_key or not temp_dir:
-        st.error("Missing API Key or Temp Directory.")
+        _notify("error", "Missing API Key or Temp Directory.")
         return
 
     # Get Active Model
@@ -424,7 +812,7 @@ def regenerate_task_audio(task, temp_dir):
     # Check Rate Limit
     allowed, msg = RateLimiter.check_limit(active_model)
     if not allowed:
-        st.error(f"Cannot regenerate: {msg}")
+        _notify("error", f"Cannot regenerate: {msg}")
         return
 
     # Generate new version
@@ -442,20 +830,20 @@ def regenerate_task_audio(task, temp_dir):
             voice_name=voice,
             style_instructions=style,
             output_path=output_file,
-            model_name=active_model
+            model_name=active_model,
+            client=_get_tts_client(api_key, active_model)
         )
 
         if success:
             RateLimiter.log_request(active_model)
-            HistoryManager.add_entry(task["char_name"], task["text"], voice, style, output_file)
+            HistoryManager.add_entry_async(task["char_name"], task["text"], voice, style, output_file)
             task["versions"].append(output_file)
             task["selected_index"] = len(task["versions"]) - 1
-            st.success(f"Regenerated {task['filename']}")
-            st.rerun()
+            _notify("success", f"Regenerated {task['filename']}")
         else:
-            st.error(f"Failed to regenerate {task['filename']}")
+            _notify("error", f"Failed to regenerate {task['filename']}")
     except Exception as e:
-        st.error(f"Error regenerating: {str(e)}")
+        _notify("error", f"Error regenerating: {str(e)}")
 
 def create_final_zip(results, temp_dir):
     if not temp_dir or not os.path.exists(temp_dir):
@@ -465,14 +853,25 @@ def create_final_zip(results, temp_dir):
     zip_path = os.path.join(temp_dir, "voiceovers_final.zip")
 
     try:
-        with zipfile.ZipFile(zip_path, 'w') as zipf:
+        # WAVs are raw PCM and don't compress meaningfully, so store them
+        # as-is rather than spending CPU on deflate.
+        with zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as zipf:
             for task in results:
                 # Get selected version
                 selected_file = task["versions"][task["selected_index"]]
-                if os.path.exists(selected_file):
-                    # Use original filename for the zip entry
-                    zip_entry_name = f"{task['filename']}.wav"
-                    zipf.write(selected_file, arcname=zip_entry_name)
+                # Use original filename for the zip entry
+                zip_entry_name = f"{task['filename']}.wav"
+                # Stream each WAV into the archive in one pass instead of
+                # handing the path to zipf.write. 1 MB source buffering and
+                # copy chunks keep the syscall count low for multi-MB files.
+                # Open directly and treat a vanished version as a skip rather
+                # than paying a stat per entry up front.
+                try:
+                    src = open(selected_file, "rb", buffering=1024 * 1024)
+                except FileNotFoundError:
+                    continue
+                with src, zipf.open(zip_entry_name, "w") as dst:
+                    shutil.copyfileobj(src, dst, length=1024 * 1024)
         return zip_path
     except Exception as e:
         st.error(f"Error creating ZIP: {str(e)}")
@@ -1,8 +1,27 @@
+import atexit
 import json
 import os
-import copy
 from typing import Dict, Any
 
+try:
+    # C-implemented JSON codec; parses and serializes the settings file a few
+    # times faster than stdlib json and emits UTF-8 bytes directly.
+    import orjson
+
+    def _json_loads(data: bytes) -> Any:
+        return orjson.loads(data)
+
+    def _json_dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+except ImportError:
+    def _json_loads(data: bytes) -> Any:
+        return json.loads(data)
+
+    def _json_dumps(obj: Any) -> bytes:
+        return json.dumps(obj, indent=2, ensure_ascii=False).encode("utf-8")
+
+__all__ = ["DataManager", "SETTINGS_FILE", "DEFAULT_SETTINGS"]
+
 SETTINGS_FILE = "settings.json"
 
 DEFAULT_SETTINGS = {
@@ -19,54 +38,125 @@ DEFAULT_SETTINGS = {
     }
 }
 
+# Serialized once at import. Cloning the defaults through the JSON codec is
+# an order of magnitude cheaper than copy.deepcopy for this small plain dict.
+_DEFAULTS_JSON = json.dumps(DEFAULT_SETTINGS).encode("utf-8")
+
+def _clone_defaults() -> Dict[str, Any]:
+    return _json_loads(_DEFAULTS_JSON)
+
 class DataManager:
+    # In-process cache of the parsed settings, invalidated by file mtime.
+    # Every getter funnels through load_settings, so without this a single
+    # Streamlit rerun re-reads and re-parses the JSON file many times.
+    _cache: Dict[str, Any] = None
+    _cache_mtime_ns: int = -1
+    # Set by setters; the file is rewritten once per flush() instead of on
+    # every individual mutation (a single rerun can save several values).
+    _dirty: bool = False
+
     @staticmethod
     def load_settings() -> Dict[str, Any]:
-        """Loads settings from the JSON file. Creates it if it doesn't exist."""
+        """Loads settings from the JSON file. Creates it if it doesn't exist.
+
+        Returns the cached parse when the file is unchanged (mtime check),
+        so repeated calls within a rerun cost one stat instead of a full
+        read + json.loads.
+        """
         if not os.path.exists(SETTINGS_FILE):
-            DataManager.save_settings(DEFAULT_SETTINGS)
-            return copy.deepcopy(DEFAULT_SETTINGS)
+            DataManager.save_settings(_clone_defaults())
+            return DataManager._cache
 
         try:
-            with open(SETTINGS_FILE, "r", encoding="utf-8") as f:
-                settings = json.load(f)
-
-                # Migration: If old flat limits exist but no model_limits, migrate them
-                if "model_limits" not in settings:
-                    old_min = settings.pop("requests_per_minute", 10)
-                    old_day = settings.pop("requests_per_day", 50)
-
-                    # Ensure models list exists
-                    if "models" not in settings:
-                        settings["models"] = copy.deepcopy(DEFAULT_SETTINGS["models"])
-
-                    if "active_model" not in settings:
-                        settings["active_model"] = DEFAULT_SETTINGS["active_model"]
-
-                    # Assign old limits to the default/first model
-                    default_model = settings["models"][0]
-                    settings["model_limits"] = {
-                        default_model: {
-                            "requests_per_minute": old_min,
-                            "requests_per_day": old_day
-                        }
+            mtime_ns = os.stat(SETTINGS_FILE).st_mtime_ns
+            if DataManager._cache is not None and mtime_ns == DataManager._cache_mtime_ns:
+                return DataManager._cache
+
+            with open(SETTINGS_FILE, "rb") as f:
+                settings = _json_loads(f.read())
+
+            # Migration: If old flat limits exist but no model_limits, migrate them
+            if "model_limits" not in settings:
+                old_min = settings.pop("requests_per_minute", 10)
+                old_day = settings.pop("requests_per_day", 50)
+
+                # Ensure models list exists
+                if "models" not in settings:
+                    settings["models"] = list(DEFAULT_SETTINGS["models"])
+
+                if "active_model" not in settings:
+                    settings["active_model"] = DEFAULT_SETTINGS["active_model"]
+
+                # Assign old limits to the default/first model
+                default_model = settings["models"][0]
+                settings["model_limits"] = {
+                    default_model: {
+                        "requests_per_minute": old_min,
+                        "requests_per_day": old_day
                     }
+                }
 
-                # Ensure all default keys exist (shallow check)
-                for key, value in DEFAULT_SETTINGS.items():
-                    if key not in settings:
-                        settings[key] = value
+            # Ensure all default keys exist (shallow check)
+            for key, value in DEFAULT_SETTINGS.items():
+                if key not in settings:
+                    settings[key] = value
 
-                return settings
-        except (json.JSONDecodeError, IOError):
-            # Fallback if file is corrupted
-            return copy.deepcopy(DEFAULT_SETTINGS)
+            DataManager._cache = settings
+            DataManager._cache_mtime_ns = mtime_ns
+            return settings
+        except (ValueError, IOError):
+            # Fallback if file is corrupted; cache it under the corrupt
+            # file's actual mtime so the next load returns this dict (and
+            # any setter mutations made against it) instead of re-parsing,
+            # failing again, and silently replacing it with fresh defaults.
+            settings = _clone_defaults()
+            DataManager._cache = settings
+            try:
+                DataManager._cache_mtime_ns = os.stat(SETTINGS_FILE).st_mtime_ns
+            except OSError:
+                DataManager._cache_mtime_ns = -1
+            return settings
 
     @staticmethod
     def save_settings(settings: Dict[str, Any]):
-        """Saves settings to the JSON file."""
-        with open(SETTINGS_FILE, "w", encoding="utf-8") as f:
-            json.dump(settings, f, indent=4, ensure_ascii=False)
+        """Saves settings to the JSON file and refreshes the cache.
+
+        The payload is serialized once and written to a temp file that is
+        fsync'd and renamed over the target: one large write syscall instead
+        of the encoder's many small ones, and a crash mid-save can never
+        leave a truncated settings file behind.
+        """
+        payload = _json_dumps(settings)
+        tmp_path = SETTINGS_FILE + ".tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            os.write(fd, payload)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(tmp_path, SETTINGS_FILE)
+
+        DataManager._cache = settings
+        DataManager._dirty = False
+        try:
+            DataManager._cache_mtime_ns = os.stat(SETTINGS_FILE).st_mtime_ns
+        except OSError:
+            DataManager._cache_mtime_ns = -1
+
+    @staticmethod
+    def _mark_dirty():
+        """Records that the cached settings differ from the file on disk."""
+        DataManager._dirty = True
+
+    @staticmethod
+    def flush():
+        """
+        Persists pending setter mutations, if any. Called at the top of each
+        Streamlit run (so a rerun triggered right after a save still lands on
+        disk) and at interpreter exit.
+        """
+        if DataManager._dirty and DataManager._cache is not None:
+            DataManager.save_settings(DataManager._cache)
 
     @staticmethod
     def get_api_key() -> str:
@@ -76,7 +166,7 @@ class DataManager:
     def save_api_key(api_key: str):
         settings = DataManager.load_settings()
         settings["api_key"] = api_key
-        DataManager.save_settings(settings)
+        DataManager._mark_dirty()
 
     @staticmethod
     def get_models() -> list[str]:
@@ -93,7 +183,7 @@ class DataManager:
                     "requests_per_minute": 10,
                     "requests_per_day": 50
                 }
-            DataManager.save_settings(settings)
+            DataManager._mark_dirty()
 
     @staticmethod
     def delete_model(model_name: str):
@@ -114,7 +204,7 @@ class DataManager:
                     settings["active_model"] = fallback
                     settings["model_limits"][fallback] = {"requests_per_minute": 10, "requests_per_day": 50}
 
-            DataManager.save_settings(settings)
+            DataManager._mark_dirty()
 
     @staticmethod
     def get_active_model() -> str:
@@ -135,7 +225,7 @@ class DataManager:
         settings = DataManager.load_settings()
         if model_name in settings["models"]:
             settings["active_model"] = model_name
-            DataManager.save_settings(settings)
+            DataManager._mark_dirty()
 
     @staticmethod
     def get_limits(model_name: str = None) -> tuple[int, int]:
@@ -163,7 +253,7 @@ class DataManager:
 
         settings["model_limits"][model_name]["requests_per_minute"] = per_minute
         settings["model_limits"][model_name]["requests_per_day"] = per_day
-        DataManager.save_settings(settings)
+        DataManager._mark_dirty()
 
     @staticmethod
     def get_characters() -> Dict[str, Dict[str, str]]:
@@ -176,11 +266,15 @@ class DataManager:
             "voice": voice,
             "style": style
         }
-        DataManager.save_settings(settings)
+        DataManager._mark_dirty()
 
     @staticmethod
     def delete_character(name: str):
         settings = DataManager.load_settings()
         if name in settings["characters"]:
             del settings["characters"][name]
-            DataManager.save_settings(settings)
+            DataManager._mark_dirty()
+
+# Make sure deferred mutations reach disk even if the process exits before
+# the next flush() call.
+atexit.register(DataManager.flush)
@@ -1,92 +1,324 @@
+import atexit
+import bisect
 import json
 import os
 import shutil
+import struct
+import threading
 import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
-from data_manager import DataManager
+from data_manager import DataManager, _json_loads
 
+__all__ = ["RateLimiter", "HistoryManager",
+           "USAGE_LOG_FILE", "HISTORY_FILE", "HISTORY_NDJSON_FILE",
+           "HISTORY_CACHE_DIR"]
+
+# Legacy JSON usage log; migrated to per-model binary files on first load.
 USAGE_LOG_FILE = "usage_log.json"
+# Per-model usage logs: "usage_<model>.bin", a flat sequence of packed
+# little-endian float64 timestamps. Logging a request is one 8-byte append
+# instead of a full JSON re-serialize of every timestamp.
+USAGE_BIN_PREFIX = "usage_"
+USAGE_BIN_SUFFIX = ".bin"
+# Legacy whole-file history; migrated to the NDJSON log on first use.
 HISTORY_FILE = "history.json"
+# Append-only history log: one JSON entry per line, oldest first. Adding an
+# entry is a single append instead of a full parse + re-dump of the list.
+HISTORY_NDJSON_FILE = "history.ndjson"
 HISTORY_CACHE_DIR = "history_cache"
 
+try:
+    import orjson
+
+    def _ndjson_line(entry: Dict[str, Any]) -> bytes:
+        return orjson.dumps(entry) + b"\n"
+except ImportError:
+    def _ndjson_line(entry: Dict[str, Any]) -> bytes:
+        return json.dumps(entry, ensure_ascii=False).encode("utf-8") + b"\n"
+
 class RateLimiter:
+    # Design note: usage is kept as exact per-request timestamps rather than
+    # fixed-window bucket counters. The sidebar gauges and the daily cap need
+    # precise sliding-window counts (bucketed windows over- or under-count at
+    # bucket edges), the lists are bounded by the daily limit so memory stays
+    # small, and bisect keeps the count path at O(log N). A deque(maxlen=
+    # day_limit) was likewise rejected: bisect needs O(1) random access,
+    # which deques don't offer, and maxlen would have to chase limits that
+    # are adjustable at runtime; the in-place prefix deletion in reserve/
+    # log_request already prunes stale entries without rebuilding the list.
+    #
+    # Serializes read-modify-write cycles on the usage log: the batch runs
+    # in background threads while the script thread can reserve or log
+    # (e.g. a regeneration), so unguarded updates could drop requests.
+    _lock = threading.RLock()
+    # Authoritative in-memory usage state (model -> sorted timestamps),
+    # loaded from disk once and written through on mutation. Checks and
+    # reservations are single atomic in-memory updates, not file reloads.
+    _usage: Optional[Dict[str, List[float]]] = None
+    # Records currently on disk per model, including pruned-from-memory ones;
+    # drives compaction once a file holds mostly dead entries.
+    _file_counts: Dict[str, int] = {}
+    # Per-model append descriptors kept open for the process lifetime, so
+    # logging a request is one write syscall with no open/close pair around it.
+    _fds: Dict[str, int] = {}
+    # Write-coalescing buffer: timestamps accepted in memory but not yet
+    # appended to disk. Flushed once _FLUSH_MAX entries accumulate or
+    # _FLUSH_SECS elapse, and at interpreter exit — bursty batches collapse
+    # many appends into one write at the cost of a ~2s crash window.
+    _pending: Dict[str, List[float]] = {}
+    _pending_count: int = 0
+    _last_flush: float = 0.0
+    _FLUSH_MAX = 16
+    _FLUSH_SECS = 2.0
+
+    @staticmethod
+    def _log_fd(model_name: str) -> int:
+        """Returns the cached append descriptor for a model's log, opening it
+        on first use. Callers must hold _lock."""
+        fd = RateLimiter._fds.get(model_name)
+        if fd is None:
+            fd = os.open(
+                RateLimiter._bin_path(model_name),
+                os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+                0o644,
+            )
+            RateLimiter._fds[model_name] = fd
+        return fd
+
+    @staticmethod
+    def _close_fds():
+        """Closes all cached log descriptors (compaction, clear, exit)."""
+        with RateLimiter._lock:
+            for fd in RateLimiter._fds.values():
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+            RateLimiter._fds.clear()
+
+    @staticmethod
+    def _bin_path(model_name: str) -> str:
+        return USAGE_BIN_PREFIX + model_name.replace(os.sep, "_") + USAGE_BIN_SUFFIX
+
+    @staticmethod
+    def _get_usage() -> Dict[str, List[float]]:
+        """Returns the in-memory usage map, loading it from disk on first use.
+        Callers must hold _lock."""
+        if RateLimiter._usage is None:
+            RateLimiter._usage = RateLimiter.load_usage()
+        return RateLimiter._usage
+
     @staticmethod
     def load_usage() -> Dict[str, List[float]]:
         """
-        Loads request timestamps (unix epoch) from file.
-        Returns a dict mapping model_name -> list of timestamps.
-        If file contains a list (old format), it migrates it to the current active model or default.
+        Loads request timestamps (unix epoch) from the per-model binary logs.
+        Returns a dict mapping model_name -> sorted list of timestamps.
+        A legacy usage_log.json (dict, or bare list in the oldest format) is
+        migrated to binary files once and then removed.
         """
-        if not os.path.exists(USAGE_LOG_FILE):
-            return {}
+        with RateLimiter._lock:
+            usage: Dict[str, List[float]] = {}
+            RateLimiter._file_counts = {}
+            try:
+                entries = list(os.scandir("."))
+            except OSError:
+                entries = []
+            for dirent in entries:
+                name = dirent.name
+                if not (name.startswith(USAGE_BIN_PREFIX) and name.endswith(USAGE_BIN_SUFFIX)):
+                    continue
+                model = name[len(USAGE_BIN_PREFIX):-len(USAGE_BIN_SUFFIX)]
+                try:
+                    with open(name, "rb") as f:
+                        data = f.read()
+                except OSError:
+                    continue
+                values = array("d")
+                values.frombytes(data[:len(data) - len(data) % 8])
+                timestamps = values.tolist()
+                timestamps.sort()  # appends are monotonic; guard clock steps
+                usage[model] = timestamps
+                RateLimiter._file_counts[model] = len(timestamps)
+
+            if not usage and os.path.exists(USAGE_LOG_FILE):
+                usage = RateLimiter._load_legacy_json()
+                for model, timestamps in usage.items():
+                    RateLimiter._rewrite_log(model, timestamps)
+                try:
+                    os.remove(USAGE_LOG_FILE)
+                except OSError:
+                    pass
+            return usage
+
+    @staticmethod
+    def _load_legacy_json() -> Dict[str, List[float]]:
         try:
             with open(USAGE_LOG_FILE, "r") as f:
                 data = json.load(f)
-
-            # Backward compatibility: if list, wrap it in a dict under the default model
+            # Oldest format: a bare list belonging to the active model.
             if isinstance(data, list):
-                active_model = DataManager.get_active_model()
-                return {active_model: data}
-
+                return {DataManager.get_active_model(): sorted(data)}
             if isinstance(data, dict):
-                return data
-
+                return {model: sorted(ts) for model, ts in data.items()}
             return {}
         except (json.JSONDecodeError, IOError):
             return {}
 
+    @staticmethod
+    def _rewrite_log(model_name: str, timestamps: List[float]):
+        """Atomically replaces a model's log with the given timestamps
+        (compaction). Callers must hold _lock."""
+        path = RateLimiter._bin_path(model_name)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(array("d", timestamps).tobytes())
+        os.replace(tmp_path, path)
+        RateLimiter._file_counts[model_name] = len(timestamps)
+        # A cached descriptor now points at the unlinked old file.
+        fd = RateLimiter._fds.pop(model_name, None)
+        if fd is not None:
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _append_log(model_name: str, new_timestamps: List[float]):
+        """Queues timestamps for append; disk writes are coalesced via
+        _flush, which reads the live list from the usage map. Callers must
+        hold _lock (the in-memory list already contains the new entries)."""
+        RateLimiter._pending.setdefault(model_name, []).extend(new_timestamps)
+        RateLimiter._pending_count += len(new_timestamps)
+        now = time.time()
+        if (RateLimiter._pending_count >= RateLimiter._FLUSH_MAX
+                or now - RateLimiter._last_flush >= RateLimiter._FLUSH_SECS):
+            RateLimiter._flush()
+
+    @staticmethod
+    def _flush():
+        """Appends buffered timestamps to the per-model logs, compacting a
+        log when dead (pruned) entries outnumber live ones."""
+        with RateLimiter._lock:
+            if RateLimiter._pending:
+                usage = RateLimiter._get_usage()
+                for model_name, new_timestamps in RateLimiter._pending.items():
+                    live = usage.get(model_name, [])
+                    count = RateLimiter._file_counts.get(model_name, 0) + len(new_timestamps)
+                    if count > 2 * len(live) and count - len(live) > 128:
+                        # The live list already holds the pending entries.
+                        RateLimiter._rewrite_log(model_name, live)
+                    else:
+                        os.write(RateLimiter._log_fd(model_name),
+                                 struct.pack(f"<{len(new_timestamps)}d", *new_timestamps))
+                        RateLimiter._file_counts[model_name] = count
+                RateLimiter._pending = {}
+                RateLimiter._pending_count = 0
+            RateLimiter._last_flush = time.time()
+
     @staticmethod
     def save_usage(usage_data: Dict[str, List[float]]):
-        """Saves request timestamps map to file."""
-        with open(USAGE_LOG_FILE, "w") as f:
-            json.dump(usage_data, f)
+        """Rewrites every model's log from the given map and adopts it in
+        memory."""
+        with RateLimiter._lock:
+            # Pending appends are superseded by the full rewrite.
+            RateLimiter._pending = {}
+            RateLimiter._pending_count = 0
+            RateLimiter._usage = usage_data
+            for model, timestamps in usage_data.items():
+                RateLimiter._rewrite_log(model, timestamps)
 
     @staticmethod
-    def check_limit(model_name: str = None) -> tuple[bool, str]:
+    def check_limit(model_name: str = None, limit_min: int = None, limit_day: int = None) -> tuple[bool, str]:
         """
         Checks if the current request is within limits for the specified (or active) model.
-        Returns (True, "") if allowed, (False, error_message) if blocked.
+        Callers that already hold the limits can pass them in to skip the
+        settings lookup. Returns (True, "") if allowed, (False, error_message) if blocked.
         """
         if model_name is None:
             model_name = DataManager.get_active_model()
 
-        limit_min, limit_day = DataManager.get_limits(model_name)
-        all_usage = RateLimiter.load_usage()
-        timestamps = all_usage.get(model_name, [])
-        now = time.time()
+        if limit_min is None or limit_day is None:
+            limit_min, limit_day = DataManager.get_limits(model_name)
 
-        # Filter timestamps
-        last_minute = [t for t in timestamps if now - t < 60]
-        last_day = [t for t in timestamps if now - t < 86400]
+        with RateLimiter._lock:
+            # Timestamps are appended in order, so the lists stay sorted and
+            # a bisect gives each window count without building filtered
+            # copies.
+            timestamps = RateLimiter._get_usage().get(model_name, [])
+            now = time.time()
+            used_min = len(timestamps) - bisect.bisect_left(timestamps, now - 60)
+            used_day = len(timestamps) - bisect.bisect_left(timestamps, now - 86400)
 
-        if len(last_minute) >= limit_min:
+        if used_min >= limit_min:
             return False, f"Rate limit exceeded for {model_name}: Max {limit_min} requests per minute."
 
-        if len(last_day) >= limit_day:
+        if used_day >= limit_day:
             return False, f"Rate limit exceeded for {model_name}: Max {limit_day} requests per day."
 
         return True, ""
 
+    @staticmethod
+    def reserve(count: int, model_name: str = None, limit_min: int = None, limit_day: int = None) -> tuple[int, str]:
+        """
+        Reserves up to `count` request slots for the specified (or active)
+        model in a single load/save round-trip, logging them immediately.
+        Returns (reserved, message); message is non-empty when fewer than
+        `count` slots were available.
+        """
+        if model_name is None:
+            model_name = DataManager.get_active_model()
+
+        if limit_min is None or limit_day is None:
+            limit_min, limit_day = DataManager.get_limits(model_name)
+
+        with RateLimiter._lock:
+            all_usage = RateLimiter._get_usage()
+            timestamps = all_usage.get(model_name, [])
+            now = time.time()
+
+            # Cleanup old logs (older than 24h): drop the sorted prefix in
+            # place rather than rebuilding the list.
+            del timestamps[:bisect.bisect_left(timestamps, now - 86400)]
+            used_min = len(timestamps) - bisect.bisect_left(timestamps, now - 60)
+
+            remaining = min(limit_min - used_min, limit_day - len(timestamps))
+            reserved = max(0, min(count, remaining))
+
+            if reserved > 0:
+                new_timestamps = [now] * reserved
+                timestamps.extend(new_timestamps)
+                all_usage[model_name] = timestamps
+                RateLimiter._append_log(model_name, new_timestamps)
+
+        if reserved < count:
+            msg = (f"Rate limit for {model_name}: only {reserved} of {count} "
+                   f"requests available (max {limit_min}/min, {limit_day}/day).")
+        else:
+            msg = ""
+        return reserved, msg
+
     @staticmethod
     def log_request(model_name: str = None):
         """Logs a successful request timestamp for the specified model."""
         if model_name is None:
             model_name = DataManager.get_active_model()
 
-        all_usage = RateLimiter.load_usage()
-        if model_name not in all_usage:
-            all_usage[model_name] = []
+        with RateLimiter._lock:
+            all_usage = RateLimiter._get_usage()
+            if model_name not in all_usage:
+                all_usage[model_name] = []
 
-        timestamps = all_usage[model_name]
-        now = time.time()
-        timestamps.append(now)
+            timestamps = all_usage[model_name]
+            now = time.time()
+            timestamps.append(now)
 
-        # Cleanup old logs (older than 24h)
-        timestamps = [t for t in timestamps if now - t < 86400]
-        all_usage[model_name] = timestamps
+            # Cleanup old logs (older than 24h)
+            del timestamps[:bisect.bisect_left(timestamps, now - 86400)]
 
-        RateLimiter.save_usage(all_usage)
+            RateLimiter._append_log(model_name, [now])
 
     @staticmethod
     def get_usage_stats(model_name: str = None) -> dict[str, int]:
@@ -94,43 +326,164 @@ class RateLimiter:
         if model_name is None:
             model_name = DataManager.get_active_model()
 
-        all_usage = RateLimiter.load_usage()
-        timestamps = all_usage.get(model_name, [])
-        now = time.time()
-
-        last_minute = [t for t in timestamps if now - t < 60]
-        last_day = [t for t in timestamps if now - t < 86400]
+        with RateLimiter._lock:
+            timestamps = RateLimiter._get_usage().get(model_name, [])
+            now = time.time()
+            used_min = len(timestamps) - bisect.bisect_left(timestamps, now - 60)
+            used_day = len(timestamps) - bisect.bisect_left(timestamps, now - 86400)
 
         return {
-            "used_min": len(last_minute),
-            "used_day": len(last_day)
+            "used_min": used_min,
+            "used_day": used_day
         }
 
     @staticmethod
     def clear_usage():
         """Clears all usage logs."""
-        RateLimiter.save_usage({})
+        with RateLimiter._lock:
+            RateLimiter._pending = {}
+            RateLimiter._pending_count = 0
+            RateLimiter._close_fds()
+            try:
+                for dirent in os.scandir("."):
+                    name = dirent.name
+                    if name.startswith(USAGE_BIN_PREFIX) and name.endswith(USAGE_BIN_SUFFIX):
+                        try:
+                            os.unlink(dirent.path)
+                        except OSError:
+                            pass
+            except OSError:
+                pass
+            if os.path.exists(USAGE_LOG_FILE):
+                try:
+                    os.remove(USAGE_LOG_FILE)
+                except OSError:
+                    pass
+            RateLimiter._usage = {}
+            RateLimiter._file_counts = {}
+
+# Offloads history writes (audio copy + NDJSON append) so generation threads
+# can start fetching the next clip instead of blocking on disk I/O.
+_IO_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="history-io")
 
 class HistoryManager:
+    # Futures for history writes still in flight on _IO_POOL.
+    _pending = []
+    # Parsed-history cache invalidated by file mtime, so UI reruns that
+    # poll get_history cost one stat, not a full NDJSON parse.
+    _cache: Optional[List[Dict[str, Any]]] = None
+    _cache_mtime_ns: int = -1
+
+    @staticmethod
+    def add_entry_async(char_name: str, text: str, voice: str, style: str, audio_source_path: str):
+        """Schedules add_entry on the I/O pool, overlapping the history
+        write with the caller's next piece of work."""
+        HistoryManager._pending.append(_IO_POOL.submit(
+            HistoryManager.add_entry,
+            char_name, text, voice, style, audio_source_path))
+
+    @staticmethod
+    def _drain():
+        """Waits for in-flight history writes; add_entry already swallows
+        its own copy errors, so failures here are not re-raised."""
+        pending, HistoryManager._pending = HistoryManager._pending, []
+        for future in pending:
+            try:
+                future.result()
+            except Exception:
+                pass
+
     @staticmethod
     def ensure_cache_dir():
         if not os.path.exists(HISTORY_CACHE_DIR):
             os.makedirs(HISTORY_CACHE_DIR)
 
+    @staticmethod
+    def _migrate_legacy():
+        """One-time migration of the old whole-file history.json to NDJSON."""
+        if os.path.exists(HISTORY_NDJSON_FILE) or not os.path.exists(HISTORY_FILE):
+            return
+        try:
+            with open(HISTORY_FILE, "rb") as f:
+                history = _json_loads(f.read())
+        except (ValueError, IOError):
+            history = []
+        if isinstance(history, list):
+            HistoryManager.save_history(history)
+        try:
+            os.remove(HISTORY_FILE)
+        except OSError:
+            pass
+
     @staticmethod
     def load_history() -> List[Dict[str, Any]]:
-        if not os.path.exists(HISTORY_FILE):
+        """Returns the history, newest first. The parsed list is cached and
+        revalidated by mtime; callers must treat it as read-only."""
+        HistoryManager._migrate_legacy()
+        if not os.path.exists(HISTORY_NDJSON_FILE):
             return []
         try:
-            with open(HISTORY_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except (json.JSONDecodeError, IOError):
+            mtime_ns = os.stat(HISTORY_NDJSON_FILE).st_mtime_ns
+            if (HistoryManager._cache is not None
+                    and mtime_ns == HistoryManager._cache_mtime_ns):
+                return HistoryManager._cache
+            with open(HISTORY_NDJSON_FILE, "rb") as f:
+                data = f.read()
+        except IOError:
             return []
+        entries = []
+        for line in data.splitlines():
+            if not line:
+                continue
+            try:
+                entries.append(_json_loads(line))
+            except ValueError:
+                continue  # torn trailing line from a crash mid-append
+        entries.reverse()  # stored oldest-first; callers expect newest-first
+        HistoryManager._cache = entries
+        HistoryManager._cache_mtime_ns = mtime_ns
+        return entries
 
     @staticmethod
     def save_history(history: List[Dict[str, Any]]):
-        with open(HISTORY_FILE, "w", encoding="utf-8") as f:
-            json.dump(history, f, indent=4, ensure_ascii=False)
+        """Rewrites the whole log from a newest-first list (clear; not on the
+        add path, which only appends)."""
+        with open(HISTORY_NDJSON_FILE, "wb") as f:
+            f.writelines(_ndjson_line(e) for e in reversed(history))
+        HistoryManager._cache = None
+        HistoryManager._cache_mtime_ns = -1
+
+    @staticmethod
+    def _copy_file(src: str, dst: str):
+        """
+        Copies src to dst in-kernel via os.copy_file_range where available,
+        so the bytes never transit userspace; falls back to shutil.copy2 on
+        platforms or filesystems that don't support it.
+        """
+        if not hasattr(os, "copy_file_range"):
+            shutil.copy2(src, dst)
+            return
+        src_fd = os.open(src, os.O_RDONLY)
+        try:
+            dst_fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            try:
+                remaining = os.fstat(src_fd).st_size
+                try:
+                    # Advances both fd offsets itself; loop in case of a
+                    # short copy.
+                    while remaining > 0:
+                        copied = os.copy_file_range(src_fd, dst_fd, remaining)
+                        if copied == 0:
+                            break
+                        remaining -= copied
+                except OSError:
+                    # EXDEV/ENOSYS on older kernels: redo in userspace
+                    # (copy2 reopens and truncates dst itself).
+                    shutil.copy2(src, dst)
+            finally:
+                os.close(dst_fd)
+        finally:
+            os.close(src_fd)
 
     @staticmethod
     def add_entry(char_name: str, text: str, voice: str, style: str, audio_source_path: str):
@@ -139,8 +492,12 @@ class HistoryManager:
         """
         HistoryManager.ensure_cache_dir()
 
-        # Generate unique filename for cache
-        timestamp_str = datetime.now().strftime("%Y%m%d_%H%M%S")
+        # Generate unique filename for cache. One clock read covers both the
+        # filename stamp and the entry timestamp; the f-string replaces
+        # strftime's format-string interpreter.
+        now = datetime.now()
+        timestamp_str = (f"{now.year:04}{now.month:02}{now.day:02}"
+                         f"_{now.hour:02}{now.minute:02}{now.second:02}")
         # Use simple hash or random part to ensure uniqueness if needed,
         # but timestamp + simple counter or just unique enough name is fine.
         # Let's use the basename of source plus timestamp to be safe.
@@ -148,16 +505,22 @@ class HistoryManager:
         cache_filename = f"{timestamp_str}_{base_name}"
         cache_path = os.path.join(HISTORY_CACHE_DIR, cache_filename)
 
-        # Copy file
+        # Hardlink when the cache shares a filesystem with the source: the
+        # generated WAVs are never modified in place (a regeneration writes a
+        # new version file), so a link is safe and skips the byte copy.
+        # Cross-device sources (e.g. a tmpfs batch dir) fall back to copying.
         try:
-            shutil.copy2(audio_source_path, cache_path)
-        except IOError as e:
-            print(f"Error copying to history cache: {e}")
-            return
+            os.link(audio_source_path, cache_path)
+        except OSError:
+            try:
+                HistoryManager._copy_file(audio_source_path, cache_path)
+            except OSError as e:
+                print(f"Error copying to history cache: {e}")
+                return
 
         # Create entry
         entry = {
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": now.isoformat(),
             "char_name": char_name,
             "text": text,
             "voice": voice,
@@ -165,17 +528,20 @@ class HistoryManager:
             "audio_path": cache_path
         }
 
-        history = HistoryManager.load_history()
-        history.insert(0, entry) # Prepend to show newest first
-        HistoryManager.save_history(history)
+        HistoryManager._migrate_legacy()
+        with open(HISTORY_NDJSON_FILE, "ab") as f:
+            f.write(_ndjson_line(entry))
 
     @staticmethod
     def get_history() -> List[Dict[str, Any]]:
+        HistoryManager._drain()  # make just-scheduled writes visible
         return HistoryManager.load_history()
 
     @staticmethod
     def clear_history():
         """Clears the history list, deletes cached files, and clears usage logs."""
+        # Don't let an in-flight async write land after the wipe.
+        HistoryManager._drain()
         # clear files
         if os.path.exists(HISTORY_CACHE_DIR):
             shutil.rmtree(HISTORY_CACHE_DIR)
@@ -183,6 +549,16 @@ class HistoryManager:
 
         # clear json
         HistoryManager.save_history([])
+        if os.path.exists(HISTORY_FILE):
+            try:
+                os.remove(HISTORY_FILE)
+            except OSError:
+                pass
 
         # clear usage logs
         RateLimiter.clear_usage()
+
+# Registered LIFO: the pending appends are flushed first, then the
+# long-lived usage-log descriptors are released.
+atexit.register(RateLimiter._close_fds)
+atexit.register(RateLimiter._flush)
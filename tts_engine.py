@@ -1,13 +1,25 @@
 import os
+import re
 import struct
-import mimetypes
+import threading
+from functools import lru_cache
 from typing import Optional
 from google import genai
 from google.genai import types
 
+# Pulls bits per sample ("audio/L16") and sample rate ("rate=24000") from a
+# mime type like "audio/L16;rate=24000" in a single scan. rate= is anchored
+# to a parameter boundary so e.g. "bitrate=128" doesn't match.
+_MIME_PARAM_RE = re.compile(
+    r"audio/L(?P<bits>\d+)|(?:^|;)\s*rate=(?P<rate>\d+)", re.IGNORECASE)
+
+@lru_cache(maxsize=32)
 def parse_audio_mime_type(mime_type: str) -> dict[str, int | None]:
     """Parses bits per sample and rate from an audio MIME type string.
 
+    The API returns the same mime type for virtually every chunk, so results
+    are memoized; callers must treat the returned dict as read-only.
+
     Assumes bits per sample is encoded like "L16" and rate as "rate=xxxxx".
 
     Args:
@@ -20,40 +32,45 @@ def parse_audio_mime_type(mime_type: str) -> dict[str, int | None]:
     bits_per_sample = 16
     rate = 24000
 
-    # Extract rate from parameters
-    parts = mime_type.split(";")
-    for param in parts: # Skip the main type part
-        param = param.strip()
-        if param.lower().startswith("rate="):
-            try:
-                rate_str = param.split("=", 1)[1]
-                rate = int(rate_str)
-            except (ValueError, IndexError):
-                # Handle cases like "rate=" with no value or non-integer value
-                pass # Keep rate as default
-        elif param.startswith("audio/L"):
-            try:
-                bits_per_sample = int(param.split("L", 1)[1])
-            except (ValueError, IndexError):
-                pass # Keep bits_per_sample as default if conversion fails
+    # One C-level regex pass instead of the split/strip/startswith loop;
+    # malformed parameters simply don't match and keep the defaults.
+    for m in _MIME_PARAM_RE.finditer(mime_type):
+        if m.group("bits"):
+            bits_per_sample = int(m.group("bits"))
+        else:
+            rate = int(m.group("rate"))
 
     return {"bits_per_sample": bits_per_sample, "rate": rate}
 
-def convert_to_wav(audio_data: bytes, mime_type: str) -> bytes:
-    """Generates a WAV file header for the given audio data and parameters.
+# Constant header for the format Gemini TTS effectively always returns
+# (16-bit / 24 kHz / mono); only the two size fields differ per clip, so
+# wav_header patches them into a copy instead of re-packing all 13 fields.
+_WAV_HEADER_TEMPLATE = struct.pack(
+    "<4sI4s4sIHHIIHH4sI",
+    b"RIFF", 0, b"WAVE", b"fmt ", 16, 1, 1, 24000, 48000, 2, 16, b"data", 0,
+)
+
+def wav_header(data_size: int, mime_type: str) -> bytes:
+    """Builds a 44-byte RIFF/WAV header for raw PCM audio.
 
     Args:
-        audio_data: The raw audio data as a bytes object.
-        mime_type: Mime type of the audio data.
+        data_size: Size of the raw audio payload in bytes.
+        mime_type: Mime type of the audio data (bits/rate are parsed from it).
 
     Returns:
-        A bytes object representing the WAV file header.
+        The WAV header as a bytes object.
     """
     parameters = parse_audio_mime_type(mime_type)
     bits_per_sample = parameters["bits_per_sample"]
     sample_rate = parameters["rate"]
+
+    if bits_per_sample == 16 and sample_rate == 24000:
+        header = bytearray(_WAV_HEADER_TEMPLATE)
+        struct.pack_into("<I", header, 4, 36 + data_size)   # ChunkSize
+        struct.pack_into("<I", header, 40, data_size)       # Subchunk2Size
+        return bytes(header)
+
     num_channels = 1
-    data_size = len(audio_data)
     bytes_per_sample = bits_per_sample // 8
     block_align = num_channels * bytes_per_sample
     byte_rate = sample_rate * block_align
@@ -77,9 +94,66 @@ def convert_to_wav(audio_data: bytes, mime_type: str) -> bytes:
         b"data",          # Subchunk2ID
         data_size         # Subchunk2Size (size of audio data)
     )
-    return header + audio_data
+    return header
+
+def convert_to_wav(audio_data: bytes, mime_type: str) -> bytearray:
+    """Prepends a WAV header to raw PCM audio data.
+
+    Off the hot path: generate_speech streams chunks and patches the header
+    in place, never concatenating header + payload. This remains for
+    one-shot callers like the silent-mock template.
+
+    Args:
+        audio_data: The raw audio data as a bytes object.
+        mime_type: Mime type of the audio data.
 
-def generate_speech(api_key: str, text: str, voice_name: str, style_instructions: str, output_path: str, model_name: str):
+    Returns:
+        A bytearray containing the complete WAV file (file writes and
+        st.audio accept it as-is; wrap in bytes() if immutability matters).
+    """
+    # One allocation sized exactly for the result; header + payload are
+    # copied into it rather than concatenated into a third buffer.
+    data_size = len(audio_data)
+    out = bytearray(44 + data_size)
+    out[:44] = wav_header(data_size, mime_type)
+    out[44:] = audio_data
+    return out
+
+# One client per API key for callers that don't manage their own (see
+# generate_speech): auth/transport setup is paid once, not per request.
+_CLIENT_CACHE: dict[str, genai.Client] = {}
+_client_cache_lock = threading.Lock()
+
+def _cached_client(api_key: str) -> genai.Client:
+    with _client_cache_lock:
+        client = _CLIENT_CACHE.get(api_key)
+        if client is None:
+            client = genai.Client(api_key=api_key)
+            _CLIENT_CACHE[api_key] = client
+        return client
+
+def create_client(api_key: str) -> genai.Client:
+    """
+    Creates a Gemini client.
+
+    The client owns the underlying HTTP session, so callers making several
+    requests (e.g. a batch) should create one client and reuse it: each fresh
+    client pays DNS + TCP + TLS handshake again on its first request.
+    """
+    return genai.Client(api_key=api_key)
+
+def warm_up_client(client: genai.Client, model_name: str):
+    """
+    Primes the client's HTTPS connection with a cheap metadata call so the
+    first real TTS request doesn't pay the connection-setup latency.
+    Failures are ignored; this is purely best-effort.
+    """
+    try:
+        client.models.get(model=model_name)
+    except Exception:
+        pass
+
+def generate_speech(api_key: str, text: str, voice_name: str, style_instructions: str, output_path: str, model_name: str, client: Optional[genai.Client] = None):
     """
     Generates speech using Gemini API and saves to output_path.
 
@@ -90,8 +164,11 @@ def generate_speech(api_key: str, text: str, voice_name: str, style_instructions
         style_instructions: Instructions for style/tone.
         output_path: The full path where the .wav file should be saved.
         model_name: The name of the Gemini model to use.
+        client: Optional pre-built client to reuse (keeps connections alive
+            across calls). A new one is created if not provided.
     """
-    client = genai.Client(api_key=api_key)
+    if client is None:
+        client = _cached_client(api_key)
     model = model_name
 
     # Construct the prompt with style instructions
@@ -121,71 +198,75 @@ def generate_speech(api_key: str, text: str, voice_name: str, style_instructions
         ),
     )
 
-    # We need to accumulate the audio data or save the first valid chunk.
-    # The example code iterates, but for a single request, we usually expect one continuous stream.
-    # We will accumulate data if multiple chunks come, or just take the valid one.
-
-    audio_buffer = bytearray()
-    mime_type = "audio/pcm" # Default assumption, will update from chunk
-
-    for chunk in client.models.generate_content_stream(
-        model=model,
-        contents=contents,
-        config=generate_content_config,
-    ):
-        if (
-            chunk.candidates is None
-            or not chunk.candidates
-            or chunk.candidates[0].content is None
-            or chunk.candidates[0].content.parts is None
-        ):
-            continue
+    # Stream chunks straight to the output file as they arrive instead of
+    # accumulating the whole clip in memory first. This overlaps the network
+    # receive with the disk write and keeps peak memory at one chunk — it
+    # also obsoletes in-memory assembly tricks (growing a bytearray vs.
+    # collecting chunks for one b"".join): there is no buffer to grow.
+    audio_written = 0
+    mime_type = "audio/pcm" # Default assumption, will update from first chunk
+    out = None
 
-        part = chunk.candidates[0].content.parts[0]
+    try:
+        for chunk in client.models.generate_content_stream(
+            model=model,
+            contents=contents,
+            config=generate_content_config,
+        ):
+            if (
+                chunk.candidates is None
+                or not chunk.candidates
+                or chunk.candidates[0].content is None
+                or chunk.candidates[0].content.parts is None
+            ):
+                continue
 
-        if part.inline_data and part.inline_data.data:
-            inline_data = part.inline_data
-            audio_buffer.extend(inline_data.data)
-            mime_type = inline_data.mime_type
+            part = chunk.candidates[0].content.parts[0]
 
-    if len(audio_buffer) > 0:
-        # Convert to WAV if needed (pcm usually needs header)
-        # The example uses mimetypes.guess_extension to check if it's already a file format
-        # but the convert_to_wav logic suggests it receives raw PCM often.
+            if part.inline_data and part.inline_data.data:
+                inline_data = part.inline_data
+                if out is None:
+                    # Gemini TTS responds with raw PCM (e.g. audio/L16;
+                    # rate=24000) rather than a container format, so there is
+                    # nothing to transcode: the first chunk's mime type
+                    # carries the sample rate / bit depth, so the real header
+                    # goes in up front and only its two size fields get
+                    # patched once the stream ends.
+                    if inline_data.mime_type:
+                        mime_type = inline_data.mime_type
+                    out = open(output_path, "wb")
+                    out.write(wav_header(0, mime_type))
+                out.write(inline_data.data)
+                audio_written += len(inline_data.data)
 
-        # If it's raw PCM (likely if mime_type is audio/pcm or similar specific types), we add header.
-        # If it's already mp3/wav, we might just save it.
-        # However, the example code specifically checks:
-        # if file_extension is None -> convert_to_wav
+        if out is None or audio_written == 0:
+            if out is not None:
+                out.close()
+                os.remove(output_path)
+            return False
 
-        ext = mimetypes.guess_extension(mime_type)
-        if ext is None or ext == ".bin": # .bin often returned for unknown types
-             final_data = convert_to_wav(bytes(audio_buffer), mime_type)
-        else:
-             # If it already has an extension, it might be a container format (like mp3 or wav)
-             # But the example force calls convert_to_wav if extension is None.
-             # Let's stick to the example logic: checks if extension is found.
-             # Actually, for Gemini TTS, usually it returns raw PCM in `audio/pcm`.
-             final_data = convert_to_wav(bytes(audio_buffer), mime_type)
-
-        with open(output_path, "wb") as f:
-            f.write(final_data)
+        out.seek(4)
+        out.write(struct.pack("<I", 36 + audio_written))  # ChunkSize
+        out.seek(40)
+        out.write(struct.pack("<I", audio_written))       # Subchunk2Size
+        out.close()
         return True
+    except Exception:
+        # Don't leave a half-written file behind on a failed stream.
+        if out is not None:
+            out.close()
+            if os.path.exists(output_path):
+                os.remove(output_path)
+        raise
 
-    return False
+# One second of 16-bit / 24 kHz mono silence, built once at import: the mock
+# output is bit-identical every call, so there is nothing to rebuild.
+_SILENT_WAV = bytes(convert_to_wav(b"\x00\x00" * 24000, "audio/L16;rate=24000"))
 
 def mock_generate_speech(text: str, output_path: str):
     """
     Mock function to generate a dummy WAV file for testing without API usage.
     """
-    # Create a simple dummy WAV file (1 second of silence or noise)
-    # 16-bit PCM, 24kHz, Mono
-    sample_rate = 24000
-    duration = 1 # second
-    num_samples = sample_rate * duration
-    data = b'\x00\x00' * num_samples # Silence
-
-    header = convert_to_wav(data, "audio/L16;rate=24000")
     with open(output_path, "wb") as f:
-        f.write(header)
+        f.write(_SILENT_WAV)
     return True